@@ -21,6 +21,20 @@ FIELD_OPTIONALLY_ENCLOSED_BY = '"'
 TRIM_SPACE = TRUE
 ERROR_ON_COLUMN_COUNT_MISMATCH = FALSE; -- Important for schema evolution
 
+-- File format for gzipped chunks of large CSV files, split on line boundaries by the loader
+CREATE OR REPLACE FILE FORMAT CSV_CHUNK_FORMAT
+TYPE = CSV
+PARSE_HEADER = TRUE
+FIELD_OPTIONALLY_ENCLOSED_BY = '"'
+TRIM_SPACE = TRUE
+ERROR_ON_COLUMN_COUNT_MISMATCH = FALSE
+COMPRESSION = GZIP
+MULTI_LINE = FALSE; -- Rows never span lines, so Snowflake can scan each chunk in parallel
+
+-- File format for CSV files converted to Parquet by the loader
+CREATE OR REPLACE FILE FORMAT PARQUET_FORMAT
+TYPE = PARQUET;
+
 -- ==============================
 -- USER PROFILES TABLE
 -- ==============================
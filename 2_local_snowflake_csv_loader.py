@@ -8,9 +8,42 @@ Update the script with the correct information for your Snowflake environment.
 
 """
 
-import os, sys
+import gzip, os, re, sys, tempfile, time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
 import snowflake.connector
 
+# Number of files uploaded to the stage at the same time
+PUT_WORKERS = 8
+
+# Staged files are loaded with one asynchronous COPY INTO per table and batch. A batch is
+# sent once it holds COPY_BATCH_SIZE files (the most a COPY INTO FILES list accepts) or
+# COPY_BATCH_SECONDS have passed, with at most COPY_CONCURRENCY COPY statements running at
+# the same time. Running statements are checked every COPY_POLL_SECONDS
+COPY_CONCURRENCY = 4
+COPY_BATCH_SIZE = 1000
+COPY_BATCH_SECONDS = 5
+COPY_POLL_SECONDS = 1
+
+# Warehouse size used while loading when the loader is run with the `resize` option, since
+# COPY INTO scans more files in parallel on a larger warehouse. Resizing needs the MODIFY
+# privilege on the warehouse and bills at the larger size; the previous size is restored afterwards
+LOAD_WAREHOUSE_SIZE = 'LARGE'
+
+# Files above this size are split into chunks of roughly CHUNK_SIZE_BYTES so that
+# the upload and the COPY INTO scan can both run in parallel. Chunks are gzipped at
+# CHUNK_COMPRESS_LEVEL, which costs little CPU and shrinks the upload several times
+SPLIT_THRESHOLD_BYTES = 250 * 1024 * 1024
+CHUNK_SIZE_BYTES = 128 * 1024 * 1024
+CHUNK_COMPRESS_LEVEL = 1
+
+# Rows per Parquet file when converting CSV files before upload, and the size of the
+# blocks the CSV reader parses in parallel
+PARQUET_CHUNK_ROWS = 500_000
+CSV_BLOCK_SIZE_BYTES = 64 * 1024 * 1024
+
 def create_snowflake_connection(test_mode=False):
     """Create Snowflake connection with optional test configuration"""
     config = {
@@ -28,81 +61,272 @@ def create_snowflake_connection(test_mode=False):
         config.update({
             'warehouse': 'TRADING_ANALYTICS_WH',
             'database': 'TRADING_ANALYTICS',
-            'schema': 'RAW_DATA'
+            'schema': 'RAW_DATA',
+            # One connection is shared by every upload and COPY INTO thread for the
+            # whole run, so keep its session alive instead of re-authenticating
+            'client_session_keep_alive': True,
+            'network_timeout': 60,
+            'session_parameters': {'QUERY_TAG': 'csv_loader'}
         })
     
     return snowflake.connector.connect(**config)
 
-def upload_file(cursor, file_path):
-    """Upload file to Snowflake stage"""
-    cursor.execute(f"PUT file://{file_path} @CSV_STAGE")
+def resize_warehouse(conn, size):
+    """Resize the connection's warehouse, returning the size it had before"""
+    cursor = conn.cursor(snowflake.connector.DictCursor)
+    try:
+        cursor.execute(f"SHOW WAREHOUSES LIKE '{conn.warehouse}'")
+        previous_size = cursor.fetchone()['size']
+        cursor.execute(f"ALTER WAREHOUSE {conn.warehouse} SET WAREHOUSE_SIZE = '{size}' WAIT_FOR_COMPLETION = TRUE")
+        return previous_size
+    finally:
+        cursor.close()
+
+def split_file(file_path, output_dir):
+    """Split a CSV file into gzipped chunks on line boundaries, repeating the header in each chunk"""
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    chunk_paths = []
+
+    with open(file_path, 'rb', buffering=1 << 20) as source:
+        header = source.readline()
+        while True:
+            block = source.read(CHUNK_SIZE_BYTES)
+            if not block:
+                break
+
+            chunk_path = os.path.join(output_dir, f"{stem}_chunk_{len(chunk_paths) + 1:05d}.csv.gz")
+            with gzip.open(chunk_path, 'wb', compresslevel=CHUNK_COMPRESS_LEVEL) as chunk:
+                chunk.write(header)
+                chunk.write(block)
+                # Finish the current row so it is not split across two chunks
+                chunk.write(source.readline())
+            chunk_paths.append(chunk_path)
+
+    return chunk_paths
+
+def convert_to_parquet(file_path, output_dir):
+    """Convert a CSV file into Snappy compressed Parquet files of PARQUET_CHUNK_ROWS rows each"""
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    parquet_paths = []
+    writer = None
+    rows_written = 0
+
+    # Arrow infers types from the first block only, so a later block with wider values would
+    # fail the read. Every column is kept as a string and COPY INTO casts to the table types.
+    # Empty unquoted fields become NULL, like EMPTY_FIELD_AS_NULL in CSV_FORMAT. The column
+    # names come from Arrow itself so they match the reader below (e.g. with a UTF-8 BOM)
+    with pa_csv.open_csv(file_path) as header_reader:
+        column_names = header_reader.schema.names
+    convert_options = pa_csv.ConvertOptions(
+        column_types={name: pa.string() for name in column_names},
+        strings_can_be_null=True,
+        quoted_strings_can_be_null=False,
+        null_values=['']
+    )
+
+    # Stream record batches from the multithreaded Arrow CSV reader instead of parsing in Python
+    read_options = pa_csv.ReadOptions(block_size=CSV_BLOCK_SIZE_BYTES, use_threads=True)
+    with pa_csv.open_csv(file_path, read_options=read_options, convert_options=convert_options) as reader:
+        try:
+            for batch in reader:
+                if writer is None or rows_written >= PARQUET_CHUNK_ROWS:
+                    if writer is not None:
+                        writer.close()
+                    parquet_path = os.path.join(output_dir, f"{stem}_part_{len(parquet_paths) + 1:05d}.parquet")
+                    writer = pq.ParquetWriter(parquet_path, reader.schema, compression='snappy')
+                    parquet_paths.append(parquet_path)
+                    rows_written = 0
+
+                writer.write_batch(batch)
+                rows_written += batch.num_rows
+        finally:
+            if writer is not None:
+                writer.close()
+
+    return parquet_paths
+
+def upload_file(conn, file_path, use_parquet=False):
+    """Upload file to Snowflake stage using its own cursor
+
+    Returns the names of the staged files and the file format to load them with.
+    """
+    filename = os.path.basename(file_path)
+    cursor = conn.cursor()
+    try:
+        # Parquet files are columnar and compressed, so Snowflake loads them faster than CSV
+        if use_parquet:
+            with tempfile.TemporaryDirectory() as parquet_dir:
+                # A CSV with only a header row has no rows to write, and a wildcard PUT that
+                # matches nothing fails, so there is nothing to stage
+                if not convert_to_parquet(file_path, parquet_dir):
+                    print(f"No rows to load in {filename}")
+                    return [], 'PARQUET_FORMAT'
+                cursor.execute(
+                    f"PUT 'file://{os.path.abspath(parquet_dir)}/*.parquet' @CSV_STAGE "
+                    f"PARALLEL = {PUT_WORKERS} AUTO_COMPRESS = FALSE"
+                )
+                return [row[1] for row in cursor.fetchall()], 'PARQUET_FORMAT'
+
+        if os.path.getsize(file_path) <= SPLIT_THRESHOLD_BYTES:
+            cursor.execute(
+                f"PUT 'file://{os.path.abspath(file_path)}' @CSV_STAGE "
+                f"AUTO_COMPRESS = TRUE SOURCE_COMPRESSION = NONE"
+            )
+            return [row[1] for row in cursor.fetchall()], 'CSV_FORMAT'
+
+        # Large files are uploaded as compressed chunks which Snowflake can load in parallel
+        with tempfile.TemporaryDirectory() as chunk_dir:
+            chunk_paths = split_file(file_path, chunk_dir)
+            print(f"Split {filename} into {len(chunk_paths)} chunks")
+            cursor.execute(
+                f"PUT 'file://{os.path.abspath(chunk_dir)}/*.csv.gz' @CSV_STAGE "
+                f"PARALLEL = {PUT_WORKERS} AUTO_COMPRESS = FALSE SOURCE_COMPRESSION = GZIP"
+            )
+            return [row[1] for row in cursor.fetchall()], 'CSV_CHUNK_FORMAT'
+    finally:
+        cursor.close()
+
+def format_files(filenames):
+    """Format staged file names for the FILES option of COPY INTO"""
+    return ", ".join(f"'{filename}'" for filename in filenames)
 
-def load_user_profiles(cursor, filename):
-    """Load user profiles"""
+def load_user_profiles(cursor, filenames, file_format='CSV_FORMAT'):
+    """Start loading user profiles, returning the COPY INTO query ID"""
     
-    cursor.execute(f"""
+    query_id = cursor.execute_async(f"""
         COPY INTO USER_PROFILES 
-        FROM '@CSV_STAGE/{filename}'
-        FILE_FORMAT = CSV_FORMAT
+        FROM @CSV_STAGE
+            FILES = ({format_files(filenames)})
             MATCH_BY_COLUMN_NAME = CASE_INSENSITIVE
-            FILE_FORMAT = (FORMAT_NAME = CSV_FORMAT)
+            FILE_FORMAT = (FORMAT_NAME = {file_format})
             ON_ERROR = 'CONTINUE'
             INCLUDE_METADATA = (
                 _loaded_at = METADATA$START_SCAN_TIME, 
                 _file_name = METADATA$FILENAME
             )        
-    """)
+    """)['queryId']
     
-    print(f"User profiles loaded from {filename}")
+    print(f"User profiles loading from {len(filenames)} files")
+    return query_id
 
-def load_order_book(cursor, filename):
-    """Load order book data """
-    cursor.execute(f"""
+def load_order_book(cursor, filenames, file_format='CSV_FORMAT'):
+    """Start loading order book data, returning the COPY INTO query ID"""
+    query_id = cursor.execute_async(f"""
         COPY INTO ORDER_BOOK 
-        FROM '@CSV_STAGE/{filename}'
+        FROM @CSV_STAGE
+            FILES = ({format_files(filenames)})
             MATCH_BY_COLUMN_NAME = CASE_INSENSITIVE
-            FILE_FORMAT = (FORMAT_NAME = CSV_FORMAT)
+            FILE_FORMAT = (FORMAT_NAME = {file_format})
             ON_ERROR = 'CONTINUE'
             INCLUDE_METADATA = (
                 _loaded_at = METADATA$START_SCAN_TIME, 
                 _file_name = METADATA$FILENAME
             )
-    """)
+    """)['queryId']
     
-    print(f"Order book data loaded from {filename}")
+    print(f"Order book data loading from {len(filenames)} files")
+    return query_id
 
-def load_user_trades(cursor, filename):
-    """Load user trades """
-    cursor.execute(f"""
+def load_user_trades(cursor, filenames, file_format='CSV_FORMAT'):
+    """Start loading user trades, returning the COPY INTO query ID"""
+    query_id = cursor.execute_async(f"""
         COPY INTO USER_TRADES
-        FROM '@CSV_STAGE/{filename}'
+        FROM @CSV_STAGE
+            FILES = ({format_files(filenames)})
             MATCH_BY_COLUMN_NAME = CASE_INSENSITIVE
-            FILE_FORMAT = (FORMAT_NAME = CSV_FORMAT)
+            FILE_FORMAT = (FORMAT_NAME = {file_format})
             ON_ERROR = 'CONTINUE'
             INCLUDE_METADATA = (
                 _loaded_at = METADATA$START_SCAN_TIME, 
                 _file_name = METADATA$FILENAME
             )
-    """)
+    """)['queryId']
     
-    print(f"User trades loaded from {filename}")
+    print(f"User trades loading from {len(filenames)} files")
+    return query_id
 
-def load_file(cursor, file_path):
-    """Load a CSV file based on its name pattern"""
-    filename = os.path.basename(file_path)
+# Load function for each file name pattern, checked in order
+LOADERS = [
+    (re.compile('user_profile', re.IGNORECASE), load_user_profiles),
+    (re.compile('order_book', re.IGNORECASE), load_order_book),
+    (re.compile('trade', re.IGNORECASE), load_user_trades),
+]
 
-    # Upload files to stage
-    upload_file(cursor, file_path)
-    
-    # Route based on filename
-    if 'user_profile' in filename.lower():
-        load_user_profiles(cursor, filename)
-    elif 'order_book' in filename.lower():
-        load_order_book(cursor, filename)
-    elif 'trade' in filename.lower():
-        load_user_trades(cursor, filename)
-    else:
-        print(f"Unknown file type: {filename}")
+def get_loader(filename):
+    """Pick the load function for a staged CSV file based on its name pattern"""
+    for pattern, loader in LOADERS:
+        if pattern.search(filename):
+            return loader
+    return None
+
+def wait_for_copy(conn, query_id):
+    """Wait for an asynchronous COPY INTO to finish, raising any error it hit"""
+    while conn.is_still_running(conn.get_query_status_throw_if_error(query_id)):
+        time.sleep(COPY_POLL_SECONDS)
+
+def load_files(conn, file_paths, use_parquet=False):
+    """Upload CSV files and load them into their tables
+
+    Uploads run in a thread pool while COPY INTO statements run asynchronously in
+    Snowflake, so files that are already staged are loaded while the remaining ones
+    are still uploading. With use_parquet the files are converted to Parquet before
+    they are uploaded.
+    """
+    cursor = conn.cursor()
+    try:
+        with ThreadPoolExecutor(max_workers=PUT_WORKERS) as put_pool:
+            uploads = {put_pool.submit(upload_file, conn, file_path, use_parquet) for file_path in file_paths}
+            copies = []
+            batches = {}
+
+            def flush(key):
+                # Drop finished statements and wait for the oldest one if too many are still running
+                copies[:] = [
+                    query_id for query_id in copies
+                    if conn.is_still_running(conn.get_query_status_throw_if_error(query_id))
+                ]
+                if len(copies) >= COPY_CONCURRENCY:
+                    wait_for_copy(conn, copies.pop(0))
+
+                loader, file_format = key
+                copies.append(loader(cursor, batches.pop(key), file_format))
+
+            flush_at = time.monotonic() + COPY_BATCH_SECONDS
+            while uploads:
+                done, uploads = wait(
+                    uploads,
+                    timeout=max(0, flush_at - time.monotonic()),
+                    return_when=FIRST_COMPLETED
+                )
+
+                for upload in done:
+                    staged_names, file_format = upload.result()
+                    for filename in staged_names:
+                        loader = get_loader(filename)
+                        if loader is None:
+                            print(f"Unknown file type: {filename}")
+                            continue
+
+                        print(f"Staged {filename}")
+                        batch = batches.setdefault((loader, file_format), [])
+                        batch.append(filename)
+                        if len(batch) >= COPY_BATCH_SIZE:
+                            flush((loader, file_format))
+
+                if time.monotonic() >= flush_at:
+                    for key in list(batches):
+                        flush(key)
+                    flush_at = time.monotonic() + COPY_BATCH_SECONDS
+
+            # Load whatever is left once every file is staged
+            for key in list(batches):
+                flush(key)
+
+            # Wait for the remaining COPY INTO statements, raising any error
+            for query_id in copies:
+                wait_for_copy(conn, query_id)
+    finally:
+        cursor.close()
 
 def main():
 
@@ -121,23 +345,30 @@ def main():
 
     # Load the data into Snowflake from the sample_data directory
     conn = create_snowflake_connection()
-    cursor = conn.cursor()
 
     try:
         sample_dir = "sample_data"
         full_sample_dir = sample_dir + "/" + sys.argv[1]
         print(f"Loading {full_sample_dir}...")
+        options = sys.argv[2:]
         if os.path.exists(full_sample_dir):
-            for filename in os.listdir(full_sample_dir):
-                if filename.endswith('.csv'):
-                    file_path = os.path.join(full_sample_dir, filename)
-                    print(f"Loading {filename}...")
-                    load_file(cursor, file_path)
+            previous_size = resize_warehouse(conn, LOAD_WAREHOUSE_SIZE) if "resize" in options else None
+            try:
+                # Stream the directory entries straight into the upload pool
+                with os.scandir(full_sample_dir) as entries:
+                    file_paths = (
+                        entry.path
+                        for entry in entries
+                        if entry.is_file() and entry.name.endswith('.csv')
+                    )
+                    load_files(conn, file_paths, use_parquet="parquet" in options)
+            finally:
+                if previous_size:
+                    resize_warehouse(conn, previous_size)
         
         print("Data loading completed!")
         
     finally:
-        cursor.close()
         conn.close()
 
 if __name__ == "__main__":
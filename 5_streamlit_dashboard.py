@@ -8,12 +8,27 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from datetime import datetime, timedelta
 import numpy as np
 from snowflake.snowpark.context import get_active_session
 from snowflake.snowpark.functions import col as col_, sum as sum_, count
 session = get_active_session()
 
+# Most points per series sent to the browser for line charts
+MAX_LINE_POINTS = 2000
+
+# Plotly config for display-only charts: no hover/zoom handlers and no mode bar
+STATIC_CHART_CONFIG = {'staticPlot': True, 'displayModeBar': False}
+
+# Display format for each currency column, applied at render time by format_currency
+CURRENCY_COLS = {
+    'TOTAL_VOLUME': '${:,.0f}',
+    'TOTAL_NOTIONAL': '${:,.2f}',
+    'AVG_PRICE': '${:,.2f}',
+    'HIGH_PRICE': '${:,.2f}',
+    'LOW_PRICE': '${:,.2f}',
+    'VWAP': '${:,.2f}'
+}
+
 # Page configuration
 st.set_page_config(
     page_title="Trading dashboard",
@@ -43,36 +58,189 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-def load_trading_metrics():    
-    """Load daily trading metrics from Snowflake"""
-    return session.table("DAILY_TRADING_METRICS").sort(col_("TRADE_DATE").desc())
+def lttb_indices(x, y, n_out):
+    """Pick the indices of n_out points that keep the shape of a line (Largest-Triangle-Three-Buckets)"""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # The first and last points are always kept, the rest are split into n_out - 2 buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    indices = np.empty(n_out, dtype=int)
+    indices[0], indices[-1] = 0, n - 1
+
+    selected = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = x[end:next_end].mean(), y[end:next_end].mean()
+
+        # Keep the point forming the largest triangle with the last kept point and the next bucket's average
+        area = np.abs(
+            (x[selected] - avg_x) * (y[start:end] - y[selected])
+            - (x[selected] - x[start:end]) * (avg_y - y[selected])
+        )
+        selected = start + int(area.argmax())
+        indices[i + 1] = selected
+
+    return indices
+
+def downsample_lines(df, x, y, color, n_out=MAX_LINE_POINTS):
+    """Downsample each colored line of a long-format frame to at most n_out points"""
+    if df.groupby(color).size().max() <= n_out:
+        return df
+
+    lines = []
+    for _, line in df.sort_values(x).groupby(color, sort=False):
+        x_values = pd.to_datetime(line[x]).astype('int64').to_numpy(dtype=float)
+        y_values = line[y].to_numpy(dtype=float)
+        lines.append(line.iloc[lttb_indices(x_values, y_values, n_out)])
+    return pd.concat(lines)
+
+def format_currency(df):
+    """Style a DataFrame so its currency columns display as dollars while staying numeric"""
+    return df.style.format({c: CURRENCY_COLS[c] for c in df.columns if c in CURRENCY_COLS}, na_rep='-')
+
+def load_metrics_probe():
+    """Load at most one row of the daily trading metrics, to check that data has been loaded"""
+    return session.table("DAILY_TRADING_METRICS").select("TRADE_DATE").limit(1)
 
 def load_top_assets():
     """Load top performing assets"""
-    return session.table("TOP_PERFORMING_ASSETS").limit(20)
+    return session.table("TOP_PERFORMING_ASSETS").select(
+        "SYMBOL", "TOTAL_VOLUME", "TOTAL_TRADES", "AVG_PRICE", "HIGH_PRICE", "LOW_PRICE"
+    ).limit(20)
 
 def load_user_summary():
     """Load user trading summary"""
-    return session.table("USER_TRADING_SUMMARY").sort(col_("TOTAL_VOLUME"), ascending=False).limit(50)
+    return session.table("USER_TRADING_SUMMARY").select(
+        "FULL_NAME", "TIER", "COUNTRY", "TOTAL_VOLUME", "TOTAL_TRADES"
+    ).sort(col_("TOTAL_VOLUME"), ascending=False).limit(50)
 
-def load_trading_patterns():
-    """Load trading patterns by hour and exchange"""
-    daily_metrics_df = session.table("DAILY_TRADING_METRICS")
+def load_tier_counts():
+    """Load the number of users in each tier across all users"""
+    return session.table("USER_TRADING_SUMMARY").group_by(col_("TIER")).agg(count("*").alias("COUNT"))
 
-    # Group by trade_hour, exchange, symbol and calculate sums
-    result_df = daily_metrics_df.group_by(
-        col_("TRADE_DATE"),
-        col_("EXCHANGE"),
-        col_("SYMBOL")
+def load_country_volume():
+    """Load total trading volume per country across all users"""
+    return session.table("USER_TRADING_SUMMARY").group_by(
+        col_("COUNTRY")
+    ).agg(
+        sum_(col_("TOTAL_VOLUME")).alias("TOTAL_VOLUME")
+    ).sort(
+        col_("TOTAL_VOLUME"), ascending=False
+    )
+
+def load_trading_patterns(group_column):
+    """Load trade counts and volume rolled up by one column of the daily trading metrics"""
+    # Rolled up in Snowflake from the daily metrics, so only one row per group is fetched
+    return session.table("DAILY_TRADING_METRICS").group_by(
+        col_(group_column)
     ).agg(
         sum_(col_("TOTAL_TRADES")).alias("TRADES"),
         sum_(col_("TOTAL_NOTIONAL")).alias("VOLUME")
     ).sort(
-        col_("TRADE_DATE"),
-        col_("VOLUME").desc()
+        col_(group_column)
     )
 
-    return result_df
+@st.cache_data(ttl=300, show_spinner=False)
+def load_dashboard_data():
+    """Load the datasets shown on every render as pandas DataFrames
+
+    All queries are submitted asynchronously first, so Snowflake runs them at the
+    same time and the wait is for the slowest query rather than for all of them.
+    """
+    jobs = {
+        'metrics_probe': load_metrics_probe().to_pandas(block=False),
+        'top_assets': load_top_assets().to_pandas(block=False),
+        'user_summary': load_user_summary().to_pandas(block=False),
+        'tier_counts': load_tier_counts().to_pandas(block=False),
+        'country_volume': load_country_volume().to_pandas(block=False),
+        'daily_patterns': load_trading_patterns('TRADE_DATE').to_pandas(block=False),
+        'exchange_patterns': load_trading_patterns('EXCHANGE').to_pandas(block=False),
+    }
+    return {name: job.result() for name, job in jobs.items()}
+
+@st.cache_data(ttl=300, show_spinner=False)
+def load_asset_metrics(symbols):
+    """Load daily trading metrics for the selected assets, newest first"""
+    metrics = session.table("DAILY_TRADING_METRICS").filter(
+        col_("SYMBOL").isin(list(symbols))
+    ).select(
+        "TRADE_DATE", "SYMBOL", "TOTAL_TRADES", "TOTAL_NOTIONAL", "AVG_PRICE", "VWAP"
+    ).sort(
+        col_("TRADE_DATE").desc(), col_("TOTAL_NOTIONAL")
+    ).to_pandas()
+    # Parse dates once before caching so reruns sort and plot on timestamps
+    metrics['TRADE_DATE'] = pd.to_datetime(metrics['TRADE_DATE'])
+    return metrics
+
+@st.cache_data(ttl=60, show_spinner=False)
+def load_kpis():
+    """Load the key performance indicators in a single query, already formatted for display"""
+    return session.sql("""
+        SELECT
+            TO_VARCHAR(SUM(TOTAL_TRADES), 'FM999,999,999,999,990') AS TOTAL_TRADES,
+            TO_VARCHAR(SUM(TOTAL_NOTIONAL), 'FM$999,999,999,999,990') AS TOTAL_VOLUME,
+            TO_VARCHAR(SUM(UNIQUE_TRADERS), 'FM999,999,999,999,990') AS UNIQUE_TRADERS,
+            TO_VARCHAR(DIV0(SUM(TOTAL_NOTIONAL), SUM(TOTAL_TRADES)), 'FM$999,999,999,999,990') AS AVG_TRADE_SIZE
+        FROM DAILY_TRADING_METRICS
+    """).collect()[0].as_dict()
+
+@st.fragment
+def render_asset_deep_dive():
+    """Asset Deep Dive tab; runs as a fragment so changing the asset selection only reruns this tab"""
+    st.header("🔍 Asset Deep Dive")
+    
+    # Asset filter
+    selected_assets = st.multiselect(
+        "Select Cryptocurrencies",
+        options=['BTC/USD', 'ETH/USD', 'ADA/USD', 'DOT/USD', 'SOL/USD', 'AVAX/USD'],
+        default=['BTC/USD', 'ETH/USD', 'SOL/USD']
+    )
+    
+    if selected_assets:
+        # Filter data for selected assets in Snowflake, sorted so the cache key ignores selection order
+        filtered_metrics = load_asset_metrics(tuple(sorted(selected_assets)))
+        
+        if not filtered_metrics.empty:
+            # Price trends
+            st.subheader("📈 Price Trends")
+            fig_prices = px.line(
+                downsample_lines(filtered_metrics, 'TRADE_DATE', 'AVG_PRICE', 'SYMBOL'),
+                x='TRADE_DATE',
+                y='AVG_PRICE',
+                color='SYMBOL',
+                title="Average Price Trends Over Time",
+                render_mode='webgl'
+            )
+            fig_prices.update_layout(height=400)
+            st.plotly_chart(fig_prices, use_container_width=True)
+            
+            # Volume trends
+            st.subheader("📊 Volume Analysis")
+            fig_volume_trend = px.bar(
+                filtered_metrics,
+                x='TRADE_DATE',
+                y='TOTAL_NOTIONAL',
+                color='SYMBOL',
+                title="Trading Volume Over Time"
+            )
+            fig_volume_trend.update_layout(height=400)
+            st.plotly_chart(fig_volume_trend, use_container_width=True)
+            
+            # Detailed metrics table
+            st.subheader("📋 Detailed Metrics")
+            
+            # Format currency columns; rows are already sorted by the loader
+            st.dataframe(
+                format_currency(filtered_metrics).format('{:%Y-%m-%d}', subset=['TRADE_DATE']),
+                use_container_width=True
+            )
+        else:
+            st.warning("No data available for the selected assets.")
+    else:
+        st.info("Please select at least one asset above to view detailed analysis.")
 
 def main():
     """Main dashboard function"""
@@ -91,59 +259,34 @@ def main():
             st.rerun()
         
         st.markdown("---")
-        
-        
-        # Asset filter
-        st.subheader("💰 Asset Selection")
-        selected_assets = st.multiselect(
-            "Select Cryptocurrencies",
-            options=['BTC/USD', 'ETH/USD', 'ADA/USD', 'DOT/USD', 'SOL/USD', 'AVAX/USD'],
-            default=['BTC/USD', 'ETH/USD', 'SOL/USD']
-        )
                 
     # Load data
     with st.spinner("Loading data from Snowflake..."):
-        trading_metrics = load_trading_metrics()
-        top_assets = load_top_assets()
-        user_summary = load_user_summary()
-        trading_patterns = load_trading_patterns()
+        data = load_dashboard_data()
+        top_assets = data['top_assets']
+        user_summary = data['user_summary']
     
-    if trading_metrics.count() == 0:
+    if data['metrics_probe'].empty:
         st.error("No data available. Please check your Snowflake connection and run the data loader first.")
         return
     
     # Key Performance Indicators
     col1, col2, col3, col4 = st.columns(4)
     
-    # Check if we have data and the required columns exist
-    if all(col in trading_metrics.columns for col in ['TOTAL_TRADES', 'TOTAL_NOTIONAL', 'UNIQUE_TRADERS']):
-        with col1:
-            total_trades = trading_metrics.select(sum_(trading_metrics['TOTAL_TRADES'])).collect()[0][0]
-            st.metric("Total Trades", f"{total_trades:,}", delta="↗️")
-        
-        with col2:
-            total_volume = float(trading_metrics.select(sum_(trading_metrics['TOTAL_NOTIONAL'])).collect()[0][0])
-            st.metric("Total Volume", f"${total_volume:,.0f}", delta="📈")
-        
-        with col3:
-            unique_traders = int(trading_metrics.select(sum_(trading_metrics['UNIQUE_TRADERS'])).collect()[0][0])
-            st.metric("Active Traders", f"{unique_traders:,}", delta="👥")
-        
-        with col4:
-            total_notional_sum = float(trading_metrics.select(sum_(trading_metrics['TOTAL_NOTIONAL'])).collect()[0][0])
-            total_trades_sum = int(trading_metrics.select(sum_(trading_metrics['UNIQUE_TRADERS'])).collect()[0][0])
-            avg_trade_size = total_notional_sum / total_trades_sum if total_trades_sum > 0 else 0
-            st.metric("Avg Trade Size", f"${avg_trade_size:,.0f}", delta="💰")
-    else:
-        # Show placeholder metrics when no data is available
-        with col1:
-            st.metric("Total Trades", "0", delta="No Data")
-        with col2:
-            st.metric("Total Volume", "$0", delta="No Data")
-        with col3:
-            st.metric("Active Traders", "0", delta="No Data")
-        with col4:
-            st.metric("Avg Trade Size", "$0", delta="No Data")
+    # All four KPIs come from one aggregated row, formatted by Snowflake
+    kpis = load_kpis()
+
+    with col1:
+        st.metric("Total Trades", kpis['TOTAL_TRADES'], delta="↗️")
+    
+    with col2:
+        st.metric("Total Volume", kpis['TOTAL_VOLUME'], delta="📈")
+    
+    with col3:
+        st.metric("Active Traders", kpis['UNIQUE_TRADERS'], delta="👥")
+    
+    with col4:
+        st.metric("Avg Trade Size", kpis['AVG_TRADE_SIZE'], delta="💰")
     
     st.markdown("---")
     
@@ -153,10 +296,10 @@ def main():
     with tab1:
         st.header("🏆 Top Performing Assets")
         
-        if not top_assets.count() == 0:
+        if not top_assets.empty:
             # Volume chart
             fig_volume = px.bar(
-                top_assets.limit(10),
+                top_assets.head(10),
                 x='SYMBOL',
                 y='TOTAL_VOLUME',
                 title="Trading Volume by Asset",
@@ -171,26 +314,26 @@ def main():
             
             with col1:
                 st.subheader("💹 Volume Leaders")
-                volume_df = top_assets[['SYMBOL', 'TOTAL_VOLUME', 'TOTAL_TRADES']].limit(10)
-                pandas_volume_df = volume_df.to_pandas()
-                pandas_volume_df['TOTAL_VOLUME'] = pd.to_numeric(pandas_volume_df['TOTAL_VOLUME'], errors='coerce').fillna(0)
-                pandas_volume_df['TOTAL_VOLUME'] = pandas_volume_df['TOTAL_VOLUME'].apply(lambda x: f"${x:,.0f}")
+                volume_df = top_assets[['SYMBOL', 'TOTAL_VOLUME', 'TOTAL_TRADES']].head(10)
                 
-                st.dataframe(volume_df, use_container_width=True)
+                # Format at render time so the columns stay numeric
+                st.dataframe(
+                    format_currency(volume_df),
+                    use_container_width=True
+                )
             
             with col2:
                 st.subheader("📈 Price Overview")
-                price_df = top_assets[['SYMBOL', 'AVG_PRICE', 'HIGH_PRICE', 'LOW_PRICE']].limit(10)
-                for col in ['AVG_PRICE', 'HIGH_PRICE', 'LOW_PRICE']:
-                    new_price_df = price_df.to_pandas()
-                    new_price_df[col] = pd.to_numeric(new_price_df[col], errors='coerce').fillna(0)
-                    new_price_df[col] = new_price_df[col].apply(lambda x: f"${x:,.2f}")
-                st.dataframe(price_df, use_container_width=True)
+                price_df = top_assets[['SYMBOL', 'AVG_PRICE', 'HIGH_PRICE', 'LOW_PRICE']].head(10)
+                st.dataframe(
+                    format_currency(price_df),
+                    use_container_width=True
+                )
     
     with tab2:
         st.header("👥 User Trading Analytics")
         
-        if not user_summary.count() == 0:
+        if not user_summary.empty:
             # User volume distribution
             fig_users = px.histogram(
                 user_summary,
@@ -207,42 +350,36 @@ def main():
             with col1:
                 # Top traders
                 st.subheader("🏆 Top Traders by Volume")
-                top_traders = user_summary.limit(10)[['FULL_NAME', 'TIER', 'TOTAL_VOLUME', 'TOTAL_TRADES']]
-                new_top_traders_df = top_traders.to_pandas()
-                new_top_traders_df['TOTAL_VOLUME'] = pd.to_numeric(new_top_traders_df['TOTAL_VOLUME'], errors='coerce').fillna(0)
-                new_top_traders_df = new_top_traders_df['TOTAL_VOLUME'].apply(lambda x: f"${x:,.0f}")
+                top_traders = user_summary.head(10)[['FULL_NAME', 'TIER', 'TOTAL_VOLUME', 'TOTAL_TRADES']]
                 
-                st.dataframe(top_traders, use_container_width=True)
+                st.dataframe(
+                    format_currency(top_traders),
+                    use_container_width=True
+                )
             
             with col2:
                 # User tier distribution
                 st.subheader("💎 User Tier Distribution")
-                tier_counts = user_summary.group_by('TIER').agg(count("*").alias("COUNT")).to_pandas()
+                tier_counts = data['tier_counts']
                 fig_tier = px.pie(
                     tier_counts,
                     values='COUNT',
-                    names=tier_counts.index,
+                    names='TIER',
                     title="Users by Tier"
                 )
                 st.plotly_chart(fig_tier, use_container_width=True)
             
             # Country analysis
-            if 'COUNTRY' in user_summary.columns:
+            country_volume = data['country_volume']
+            if not country_volume.empty:
                 st.subheader("🌍 Trading by Country")
-                country_volume = user_summary.group_by(
-                    col_("COUNTRY")
-                ).agg(
-                    sum_(col_("TOTAL_VOLUME")).alias("TOTAL_VOLUME")
-                ).sort(
-                    col_("TOTAL_VOLUME").desc()
-                ).to_pandas()
                 fig_country = px.bar(country_volume,
                     x='COUNTRY',
                     y='TOTAL_VOLUME',
                     title="Trading Volume by Country"
                 )
                 fig_country.update_layout(height=400)
-                st.plotly_chart(fig_country, use_container_width=True)
+                st.plotly_chart(fig_country, use_container_width=True, config=STATIC_CHART_CONFIG)
 
 
                
@@ -250,13 +387,10 @@ def main():
     with tab3:
         st.header("⏰ Trading Patterns & Timing")
         
-        if not trading_patterns.count() == 0:
-            # Trading activity by hour
-            hourly_data = trading_patterns.group_by('TRADE_DATE').agg(
-                sum_('TRADES').alias('TRADES'),  
-                sum_('VOLUME').alias('VOLUME')    
-            ).to_pandas()
+        hourly_data = data['daily_patterns']
 
+        if not hourly_data.empty:
+            # Trading activity by hour
             fig_hourly = make_subplots(
                 rows=2, cols=1,
                 subplot_titles=('Trading Volume by Hour', 'Number of Trades by Hour'),
@@ -283,10 +417,7 @@ def main():
             # Exchange comparison
             st.subheader("🏢 Exchange Performance")
               
-            exchange_data = trading_patterns.group_by('EXCHANGE').agg(
-                sum_('TRADES').alias('TRADES'),
-                sum_('VOLUME').alias('VOLUME')
-            ).to_pandas()
+            exchange_data = data['exchange_patterns']
             
             col1, col2 = st.columns(2)
             
@@ -297,7 +428,7 @@ def main():
                     names='EXCHANGE',
                     title="Volume Distribution by Exchange"
                 )
-                st.plotly_chart(fig_ex_vol, use_container_width=True)
+                st.plotly_chart(fig_ex_vol, use_container_width=True, config=STATIC_CHART_CONFIG)
             
             with col2:
                 fig_ex_trades = px.pie(
@@ -306,63 +437,10 @@ def main():
                     names='EXCHANGE',
                     title="Trade Count by Exchange"
                 )
-                st.plotly_chart(fig_ex_trades, use_container_width=True)
+                st.plotly_chart(fig_ex_trades, use_container_width=True, config=STATIC_CHART_CONFIG)
     
     with tab4:
-        st.header("🔍 Asset Deep Dive")
-        
-        if selected_assets and not trading_metrics.count() == 0:
-            # Filter data for selected assets
-            filtered_metrics = trading_metrics[trading_metrics['SYMBOL'].isin(selected_assets)]
-            
-            if not filtered_metrics.count() == 0:
-                # Price trends
-                st.subheader("📈 Price Trends")
-                fig_prices = px.line(
-                    filtered_metrics,
-                    x='TRADE_DATE',
-                    y='AVG_PRICE',
-                    color='SYMBOL',
-                    title="Average Price Trends Over Time"
-                )
-                fig_prices.update_layout(height=400)
-                st.plotly_chart(fig_prices, use_container_width=True)
-                
-                # Volume trends
-                st.subheader("📊 Volume Analysis")
-                fig_volume_trend = px.bar(
-                    filtered_metrics,
-                    x='TRADE_DATE',
-                    y='TOTAL_NOTIONAL',
-                    color='SYMBOL',
-                    title="Trading Volume Over Time"
-                )
-                fig_volume_trend.update_layout(height=400)
-                st.plotly_chart(fig_volume_trend, use_container_width=True)
-                
-                # Detailed metrics table
-                st.subheader("📋 Detailed Metrics")
-                detailed_df = filtered_metrics[['TRADE_DATE', 'SYMBOL', 'TOTAL_TRADES', 'TOTAL_NOTIONAL', 'AVG_PRICE', 'VWAP']]
-                detailed_df = detailed_df.sort(col_('TRADE_DATE').desc(), col_('TOTAL_NOTIONAL'))
-                
-                # Format currency columns
-                for col in ['TOTAL_NOTIONAL', 'AVG_PRICE', 'VWAP']:
-                    new_detailed_df = detailed_df.to_pandas()
-                    new_detailed_df[col] = pd.to_numeric(new_detailed_df[col], errors='coerce').fillna(0)
-                    new_detailed_df[col] = new_detailed_df[col].apply(lambda x: f"${x:,.2f}")
-
-
-                    # new_price_df = price_df.to_pandas()
-                    # new_price_df[col] = pd.to_numeric(new_price_df[col], errors='coerce').fillna(0)
-                    # new_price_df[col] = new_price_df[col].apply(lambda x: f"${x:,.2f}")
-
-                    
-                
-                st.dataframe(detailed_df, use_container_width=True)
-            else:
-                st.warning("No data available for the selected assets.")
-        else:
-            st.info("Please select at least one asset from the sidebar to view detailed analysis.")
+        render_asset_deep_dive()
     
     # Footer
     st.markdown("---")